@@ -2,15 +2,26 @@
 
 from __future__ import annotations
 
+import asyncio
+import base64
+import binascii
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 # NEW: load .env next to this file
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env")
 
+import orjson
 import requests
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 SUPABASE_URL: Optional[str] = os.environ.get("SUPABASE_URL")
 SUPABASE_API_KEY: Optional[str] = os.environ.get("SUPABASE_API_KEY")
@@ -35,14 +46,54 @@ REPORTS_TABLE: str = os.environ.get("SUPABASE_REPORTS_TABLE", "user_reports")
 REPORT_ID_FIELD: str = os.environ.get("SUPABASE_REPORT_ID_FIELD", "id")
 
 
+_CONFIGURED: bool = False
+
+# short-lived read caches; identical lookups tend to arrive within the same few seconds
+_CACHE_TTL_SECONDS = 5
+_CACHE_LOCK = threading.Lock()
+_LISTING_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=_CACHE_TTL_SECONDS)
+_PROFILE_CACHE: TTLCache = TTLCache(maxsize=4096, ttl=_CACHE_TTL_SECONDS)
+_LISTINGS_CACHE: TTLCache = TTLCache(maxsize=256, ttl=_CACHE_TTL_SECONDS)
+# existence checks only cache hits, so a user who signs up is visible immediately
+_USER_EXISTS_TTL_SECONDS = 60
+_USER_EXISTS_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=_USER_EXISTS_TTL_SECONDS)
+
+_loads = orjson.loads
+_dumps = orjson.dumps
+
+# per-request headers layered on top of the session's auth headers
+_PREFER_REPRESENTATION: Dict[str, str] = {"Prefer": "return=representation"}
+_PREFER_MERGE: Dict[str, str] = {"Prefer": "resolution=merge-duplicates,return=representation"}
+
+
 def _ensure_config():
     # Refresh from environment in case load happened later or server reloaded
-    global SUPABASE_URL, SUPABASE_API_KEY
+    global SUPABASE_URL, SUPABASE_API_KEY, _CONFIGURED
+    if _CONFIGURED:
+        return
     if not SUPABASE_URL or not SUPABASE_API_KEY:
         SUPABASE_URL = (os.environ.get("SUPABASE_URL") or "").rstrip("/")
         SUPABASE_API_KEY = os.environ.get("SUPABASE_API_KEY")
     if not SUPABASE_URL or not SUPABASE_API_KEY:
         raise RuntimeError("SUPABASE_URL and SUPABASE_API_KEY environment variables must be set")
+    _CONFIGURED = True
+
+def _cache_get(cache: TTLCache, key: str) -> Any:
+    with _CACHE_LOCK:
+        return cache.get(key)
+
+
+def _cache_set(cache: TTLCache, key: str, value: Any) -> None:
+    with _CACHE_LOCK:
+        cache[key] = value
+
+
+def _invalidate_listing(listing_id: str) -> None:
+    # any listing write can change what the cached list queries return
+    with _CACHE_LOCK:
+        _LISTING_CACHE.pop(listing_id, None)
+        _LISTINGS_CACHE.clear()
+
 
 def _headers() -> Dict[str, str]:
     #construct headers for supabase REST requests
@@ -55,44 +106,77 @@ def _headers() -> Dict[str, str]:
     }
 
 
+_SESSION_LOCK = threading.Lock()
+_SESSION: Optional[requests.Session] = None
+
+
+def _session() -> requests.Session:
+    # shared keep-alive session so every supabase call reuses pooled TCP/TLS connections
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=20,
+                    pool_maxsize=100,
+                    max_retries=Retry(
+                        total=3,
+                        backoff_factor=0.1,
+                        status_forcelist=[502, 503, 504],
+                        raise_on_status=False,
+                    ),
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(_headers())
+                _SESSION = session
+    return _SESSION
+
+
+# the _normalize_* helpers rewrite freshly parsed PostgREST rows in place,
+# so callers must not hand them a dict they still need unmodified
+_CLOTHING_UPPERCASE_FIELDS = ("gender", "size", "type", "color")
+_DECOR_UPPERCASE_FIELDS = ("type", "color")
+_DECOR_DIMENSION_FIELDS = ("length", "width", "height")
+_TICKET_UPPERCASE_FIELDS = ("type",)
+
+
+_TRUTHY = frozenset(("true", "t", "1"))
+
+
+def _coerce_flag(value: Any) -> bool:
+    # postgrest may hand back booleans as text depending on the column type
+    if type(value) is str:
+        return value.strip().lower() in _TRUTHY
+    return bool(value)
+
+
+def _coerce_used(details: Dict[str, Any]) -> None:
+    details["used"] = _coerce_flag(details.get("used"))
+
+
+def _uppercase_fields(details: Dict[str, Any], fields: Tuple[str, ...]) -> None:
+    for key in fields:
+        value = details.get(key)
+        if isinstance(value, str):
+            details[key] = value.upper()
+
+
 def _normalize_clothing_details(record: Dict[str, Any]) -> Dict[str, Any]:
-    details = dict(record)
-    used = details.get("used")
-    if isinstance(used, str):
-        details["used"] = used.lower() in {"true", "1"}
-    elif used is None:
-        details["used"] = False
-    gender = details.get("gender")
-    if isinstance(gender, str):
-        details["gender"] = gender.upper()
-    size = details.get("size")
-    if isinstance(size, str):
-        details["size"] = size.upper()
-    clothing_type = details.get("type")
-    if isinstance(clothing_type, str):
-        details["type"] = clothing_type.upper()
-    color = details.get("color")
-    if isinstance(color, str):
-        details["color"] = color.upper()
+    details = record
+    _coerce_used(details)
+    _uppercase_fields(details, _CLOTHING_UPPERCASE_FIELDS)
     details["category"] = "clothing"
     details.pop(CLOTHING_ID_FIELD, None)
     return details
 
 
 def _normalize_decor_details(record: Dict[str, Any]) -> Dict[str, Any]:
-    details = dict(record)
-    used = details.get("used")
-    if isinstance(used, str):
-        details["used"] = used.lower() in {"true", "1"}
-    elif used is None:
-        details["used"] = False
-    decor_type = details.get("type")
-    if isinstance(decor_type, str):
-        details["type"] = decor_type.upper()
-    color = details.get("color")
-    if isinstance(color, str):
-        details["color"] = color.upper()
-    for key in ("length", "width", "height"):
+    details = record
+    _coerce_used(details)
+    _uppercase_fields(details, _DECOR_UPPERCASE_FIELDS)
+    for key in _DECOR_DIMENSION_FIELDS:
         value = details.get(key)
         if isinstance(value, str):
             try:
@@ -105,10 +189,8 @@ def _normalize_decor_details(record: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def _normalize_ticket_details(record: Dict[str, Any]) -> Dict[str, Any]:
-    details = dict(record)
-    ticket_type = details.get("type")
-    if isinstance(ticket_type, str):
-        details["type"] = ticket_type.upper()
+    details = record
+    _uppercase_fields(details, _TICKET_UPPERCASE_FIELDS)
     details["category"] = "tickets"
     details.pop(TICKETS_ID_FIELD, None)
     return details
@@ -133,7 +215,7 @@ def _build_decor_payload(listing_id: str, details: Dict[str, Any]) -> Dict[str,
         "color": details.get("color"),
         "used": bool(details.get("used", False)),
     }
-    for dimension in ("length", "width", "height"):
+    for dimension in _DECOR_DIMENSION_FIELDS:
         value = details.get(dimension)
         if value is None or value == "":
             payload[dimension] = None
@@ -152,6 +234,8 @@ def _build_ticket_payload(listing_id: str, details: Dict[str, Any]) -> Dict[str,
     }
 
 
+_DETAIL_EXECUTOR = ThreadPoolExecutor(max_workers=12, thread_name_prefix="supabase-details")
+
 _CATEGORY_DETAIL_CONFIG: Dict[str, Dict[str, Any]] = {
     "clothing": {
         "table": CLOTHING_TABLE,
@@ -174,7 +258,7 @@ _CATEGORY_DETAIL_CONFIG: Dict[str, Dict[str, Any]] = {
 }
 
 
-def _select_clause_with_details() -> str:
+def _build_select_clause_with_details() -> str:
     relations = []
     for config in _CATEGORY_DETAIL_CONFIG.values():
         table = config.get("table")
@@ -186,6 +270,15 @@ def _select_clause_with_details() -> str:
     return f"*,{','.join(relations)}"
 
 
+# table names come from env vars read at import, so the clause never changes
+_SELECT_WITH_DETAILS: str = _build_select_clause_with_details()
+
+
+def _select_clause_with_details() -> str:
+    return _SELECT_WITH_DETAILS
+
+
+@lru_cache(maxsize=1)
 def _product_relationship() -> str:
     if PRODUCT_RELATION:
         return PRODUCT_RELATION
@@ -193,23 +286,33 @@ def _product_relationship() -> str:
     return f"{PRODUCTS_TABLE}!Transactions_{PRODUCT_ID_FIELD}_fkey"
 
 
+@lru_cache(maxsize=2)
+def _order_select_clause(inner: bool = False) -> str:
+    # transactions embed their product (with category details) under the "product" key;
+    # an inner embed lets product.* filters drop non-matching transactions in the same query
+    relationship = f"{_product_relationship()}!inner" if inner else _product_relationship()
+    return f"*,product:{relationship}({_select_clause_with_details()})"
+
+
+_eq = "eq.{}".format
+_BOOL_EQ = {True: "eq.true", False: "eq.false"}
+
+
 def _apply_filters(params: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> None:
     if not filters:
         return
     for key, value in filters.items():
         if value is None:
             continue
-        if isinstance(value, bool):
-            params[key] = f"eq.{str(value).lower()}"
-        else:
-            params[key] = f"eq.{value}"
+        params[key] = _BOOL_EQ[value] if type(value) is bool else _eq(value)
 
 
 def _normalize_product(record: Dict[str, Any]) -> Dict[str, Any]:
     if not record:
         return record
-    normalized = dict(record)
-    product_id = normalized.get(PRODUCT_ID_FIELD) or normalized.get("id")
+    normalized = record
+    # keep a single id key per row rather than carrying the raw PostgREST column alongside it
+    product_id = normalized.pop(PRODUCT_ID_FIELD, None) or normalized.get("id")
     if product_id:
         normalized["id"] = product_id
     price = normalized.get("price")
@@ -236,32 +339,30 @@ def _normalize_product(record: Dict[str, Any]) -> Dict[str, Any]:
         normalized["description"] = None
     elif not isinstance(description, str):
         normalized["description"] = str(description)
+    # only the table matching the listing category carries details, the others are just dropped
+    detail_config = _CATEGORY_DETAIL_CONFIG.get(normalized["category"])
     for config in _CATEGORY_DETAIL_CONFIG.values():
         table = config.get("table")
         if not table:
             continue
         raw_details = normalized.pop(table, None)
-        if not raw_details:
+        if config is not detail_config or not raw_details:
             continue
         if isinstance(raw_details, list):
             raw_details = raw_details[0] if raw_details else None
         if not raw_details:
             continue
         normalized["details"] = config["normalizer"](raw_details)
-        break
     return normalized
 
 
-def _derive_order_status(order: Dict[str, Any]) -> str:
-    buyer_confirmed = bool(order.get("buyer_confirmed"))
-    seller_confirmed = bool(order.get("seller_confirmed"))
-    if buyer_confirmed and seller_confirmed:
-        return "complete"
-    if buyer_confirmed:
-        return "buyer_confirmed"
-    if seller_confirmed:
-        return "seller_confirmed"
-    return "pending_meetup"
+# (buyer_confirmed, seller_confirmed) -> derived order status
+_ORDER_STATUS: Dict[Tuple[bool, bool], str] = {
+    (True, True): "complete",
+    (True, False): "buyer_confirmed",
+    (False, True): "seller_confirmed",
+    (False, False): "pending_meetup",
+}
 
 
 def _normalize_order(record: Dict[str, Any]) -> Dict[str, Any]:
@@ -269,7 +370,7 @@ def _normalize_order(record: Dict[str, Any]) -> Dict[str, Any]:
         return record
     if not isinstance(record, dict):
         raise ValueError(f"Unexpected order payload type: {type(record)!r} -> {record}")
-    normalized = dict(record)
+    normalized = record
     order_id = (
         normalized.get(TRANSACTION_ID_FIELD)
         or normalized.get("id")
@@ -283,15 +384,9 @@ def _normalize_order(record: Dict[str, Any]) -> Dict[str, Any]:
         normalized["product"] = product_normalized
         if "seller_id" in product_normalized and not normalized.get("seller_id"):
             normalized["seller_id"] = product_normalized["seller_id"]
-    for flag in ("buyer_confirmed", "seller_confirmed"):
-        value = normalized.get(flag)
-        if isinstance(value, str):
-            normalized[flag] = value.strip().lower() in {"true", "t", "1"}
-        elif isinstance(value, (int, float)):
-            normalized[flag] = bool(value)
-        else:
-            normalized[flag] = bool(value)
-    normalized["status"] = _derive_order_status(normalized)
+    buyer_confirmed = normalized["buyer_confirmed"] = _coerce_flag(normalized.get("buyer_confirmed"))
+    seller_confirmed = normalized["seller_confirmed"] = _coerce_flag(normalized.get("seller_confirmed"))
+    normalized["status"] = _ORDER_STATUS[buyer_confirmed, seller_confirmed]
     prod_id = normalized.get("prod_id")
     if prod_id:
         normalized["listing_id"] = prod_id
@@ -301,7 +396,7 @@ def _normalize_order(record: Dict[str, Any]) -> Dict[str, Any]:
 def _normalize_report(record: Dict[str, Any]) -> Dict[str, Any]:
     if not record:
         return record
-    normalized = dict(record)
+    normalized = record
     report_id = normalized.get(REPORT_ID_FIELD) or normalized.get("id")
     if report_id:
         normalized["id"] = report_id
@@ -317,10 +412,8 @@ def _normalize_report(record: Dict[str, Any]) -> Dict[str, Any]:
 
 def _upsert_category_detail(table: str, id_field: str, payload: Dict[str, Any]) -> None:
     url = f"{SUPABASE_URL}/rest/v1/{table}"
-    headers = _headers()
-    headers["Prefer"] = "resolution=merge-duplicates,return=representation"
     params = {"on_conflict": id_field}
-    resp = requests.post(url, headers=headers, params=params, json=payload)
+    resp = _session().post(url, headers=_PREFER_MERGE, params=params, data=_dumps(payload))
     if not resp.ok:
         print(f"SUPABASE UPSERT ERROR ({table}):", resp.status_code, resp.text)
         resp.raise_for_status()
@@ -328,17 +421,59 @@ def _upsert_category_detail(table: str, id_field: str, payload: Dict[str, Any])
 
 def _delete_category_detail(table: str, id_field: str, listing_id: str) -> None:
     url = f"{SUPABASE_URL}/rest/v1/{table}"
-    resp = requests.delete(url, headers=_headers(), params={id_field: f"eq.{listing_id}"})
+    resp = _session().delete(url, params={id_field: _eq(listing_id)})
     # 204 / 200 both acceptable, raise on actual error
     if resp.status_code not in (200, 204):
         resp.raise_for_status()
 
 
+def _run_detail_calls(calls: List[Tuple[Callable[..., None], Tuple[Any, ...]]]) -> None:
+    # the category tables are independent, so fire their requests concurrently over the pooled session
+    if len(calls) == 1:
+        func, args = calls[0]
+        func(*args)
+        return
+    futures = [_DETAIL_EXECUTOR.submit(func, *args) for func, args in calls]
+    for future in futures:
+        future.result()
+
+
+# backend/sql/003_sync_listing_category.sql hard-codes the default detail tables, so the RPC
+# is only used when none of them have been renamed through env overrides
+_SYNC_RPC_AVAILABLE: bool = (
+    (CLOTHING_TABLE, CLOTHING_ID_FIELD, DECOR_TABLE, DECOR_ID_FIELD, TICKETS_TABLE, TICKETS_ID_FIELD)
+    == ("Clothing", "clothing_id", "Decor", "decor_id", "Tickets", "tickets_id")
+)
+
+
+def _sync_category_details_rpc(
+    listing_id: str, category: Optional[str], details: Optional[Dict[str, Any]]
+) -> bool:
+    # single round-trip via backend/sql/003_sync_listing_category.sql, False when the function isn't deployed
+    config = _CATEGORY_DETAIL_CONFIG.get(category or "")
+    payload = config["builder"](listing_id, details) if config and details else None
+    url = f"{SUPABASE_URL}/rest/v1/rpc/sync_listing_category"
+    body = {"p_id": listing_id, "p_cat": category or "", "p_payload": payload}
+    resp = _session().post(url, data=_dumps(body))
+    if resp.status_code == 404:
+        return False
+    if not resp.ok:
+        print("SUPABASE RPC ERROR (sync_listing_category):", resp.status_code, resp.text)
+        resp.raise_for_status()
+    return True
+
+
 def _sync_category_details(
     listing_id: str, category: Optional[str], details: Optional[Dict[str, Any]]
 ) -> None:
     # make sure additional category tables stay in sync with the main Product row
+    global _SYNC_RPC_AVAILABLE
+    if _SYNC_RPC_AVAILABLE:
+        if _sync_category_details_rpc(listing_id, category, details):
+            return
+        _SYNC_RPC_AVAILABLE = False
     target_category = category or ""
+    calls: List[Tuple[Callable[..., None], Tuple[Any, ...]]] = []
     for slug, config in _CATEGORY_DETAIL_CONFIG.items():
         table = config.get("table")
         id_field = config.get("id_field")
@@ -347,46 +482,130 @@ def _sync_category_details(
             continue
         if slug == target_category and details:
             payload = builder(listing_id, details)
-            _upsert_category_detail(table, id_field, payload)
+            calls.append((_upsert_category_detail, (table, id_field, payload)))
         else:
-            _delete_category_detail(table, id_field, listing_id)
+            calls.append((_delete_category_detail, (table, id_field, listing_id)))
+    if calls:
+        _run_detail_calls(calls)
 
 
 def _delete_all_category_details(listing_id: str) -> None:
-    for config in _CATEGORY_DETAIL_CONFIG.values():
-        table = config.get("table")
-        id_field = config.get("id_field")
-        if not table or not id_field:
-            continue
-        _delete_category_detail(table, id_field, listing_id)
+    # syncing without a category clears every detail table
+    _sync_category_details(listing_id, None, None)
 
 
-def get_listings(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    #return a list of all products
+def _apply_synced_details(
+    product: Dict[str, Any], category: Optional[str], details: Optional[Dict[str, Any]]
+) -> None:
+    # mirror what _sync_category_details just wrote so callers don't need a refresh GET
+    config = _CATEGORY_DETAIL_CONFIG.get(category or "")
+    if config and details:
+        payload = config["builder"](product.get("id"), details)
+        product["details"] = config["normalizer"](payload)
+    else:
+        product.pop("details", None)
+
+
+_CURSOR_ID_SAFE = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
+
+
+def listing_cursor(listing: Dict[str, Any]) -> str:
+    # opaque keyset cursor pointing just past this listing in created_at desc, id desc order
+    raw = _dumps([listing.get("created_at"), listing.get("id")])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_listing_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, listing_id = _loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error) as exc:
+        raise ValueError("Invalid listings cursor") from exc
+    if not isinstance(created_at, str) or not isinstance(listing_id, str):
+        raise ValueError("Invalid listings cursor")
+    # both parts are pasted into a PostgREST or= filter, so only let well-formed values through
+    try:
+        created_at = datetime.fromisoformat(created_at).isoformat()
+    except ValueError as exc:
+        raise ValueError("Invalid listings cursor") from exc
+    if not listing_id or not _CURSOR_ID_SAFE.issuperset(listing_id):
+        raise ValueError("Invalid listings cursor")
+    return created_at, listing_id
+
+
+def get_listings(
+    filters: Optional[Dict[str, Any]] = None,
+    page_size: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    #return a list of all products, or one keyset page of them when page_size is given
 
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
     params: Dict[str, Any] = {"select": _select_clause_with_details()}
     _apply_filters(params, filters)
-    resp = requests.get(url, headers=_headers(), params=params)
+    if page_size is not None:
+        params["order"] = f"created_at.desc,{PRODUCT_ID_FIELD}.desc"
+        params["limit"] = page_size
+        if cursor:
+            created_at, listing_id = _decode_listing_cursor(cursor)
+            params["or"] = (
+                f'(created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",{PRODUCT_ID_FIELD}.lt."{listing_id}"))'
+            )
+    cache_key = tuple(sorted(params.items()))
+    cached = _cache_get(_LISTINGS_CACHE, cache_key)
+    if cached is not None:
+        return cached
+    resp = _session().get(url, params=params)
+    resp.raise_for_status()
+    data = _loads(resp.content)
+    listings = [_normalize_product(product) for product in data]
+    _cache_set(_LISTINGS_CACHE, cache_key, listings)
+    return listings
+
+
+def get_listing(listing_id: str, cached: bool = True) -> Optional[Dict[str, Any]]:
+    # return a single product by its id or none if it is not found; cached=False skips the read cache
+
+    _ensure_config()
+    url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
+    params = {
+        PRODUCT_ID_FIELD: _eq(listing_id),
+        "select": _select_clause_with_details(),
+    }
+    if cached:
+        hit = _cache_get(_LISTING_CACHE, listing_id)
+        if hit is not None:
+            return hit
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    data = resp.json()
-    return [_normalize_product(product) for product in data]
+    products = _loads(resp.content)
+    if not products:
+        return None
+    product = _normalize_product(products[0])
+    _cache_set(_LISTING_CACHE, listing_id, product)
+    return product
 
 
-def get_listing(listing_id: str) -> Optional[Dict[str, Any]]:
-    # return a single product by its id or none if it is not found
+def get_listings_by_ids(listing_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    # fetch many products in one request, keyed by id (missing ids are simply absent)
 
+    if not listing_ids:
+        return {}
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
     params = {
-        PRODUCT_ID_FIELD: f"eq.{listing_id}",
+        PRODUCT_ID_FIELD: f"in.({','.join(dict.fromkeys(listing_ids))})",
         "select": _select_clause_with_details(),
     }
-    resp = requests.get(url, headers=_headers(), params=params)
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    products = resp.json()
-    return _normalize_product(products[0]) if products else None
+    products = _loads(resp.content)
+    listings: Dict[str, Dict[str, Any]] = {}
+    for product in products:
+        normalized = _normalize_product(product)
+        listings[normalized["id"]] = normalized
+    return listings
 
 
 def create_listing(
@@ -397,21 +616,20 @@ def create_listing(
 
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    resp = requests.post(url, headers=headers, json=listing_data)
+    params = {"select": _select_clause_with_details()}
+    resp = _session().post(url, headers=_PREFER_REPRESENTATION, params=params, data=_dumps(listing_data))
     if not resp.ok:
         print("SUPABASE INSERT ERROR:", resp.status_code, resp.text)
         resp.raise_for_status()
-    created = resp.json()
+    created = _loads(resp.content)
     product = _normalize_product(created[0])
     listing_id = product.get("id")
     category = product.get("category")
     if listing_id and (details is not None or category in _CATEGORY_DETAIL_CONFIG):
         _sync_category_details(listing_id, category, details)
-        refreshed = get_listing(listing_id)
-        if refreshed:
-            return refreshed
+        _apply_synced_details(product, category, details)
+    if listing_id:
+        _invalidate_listing(listing_id)
     return product
 
 
@@ -425,22 +643,24 @@ def update_listing(
 
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    resp = requests.patch(
+    resp = _session().patch(
         url,
-        headers=headers,
-        params={PRODUCT_ID_FIELD: f"eq.{listing_id}"},
-        json=listing_data,
+        headers=_PREFER_REPRESENTATION,
+        params={
+            PRODUCT_ID_FIELD: _eq(listing_id),
+            "select": _select_clause_with_details(),
+        },
+        data=_dumps(listing_data),
     )
     resp.raise_for_status()
-    updated = resp.json()
+    updated = _loads(resp.content)
     product = _normalize_product(updated[0])
     final_category = category or product.get("category")
     if details is not None or category is not None:
         _sync_category_details(listing_id, final_category, details)
-    refreshed = get_listing(listing_id)
-    return refreshed or product
+        _apply_synced_details(product, final_category, details)
+    _invalidate_listing(listing_id)
+    return product
 
 
 def delete_listing(listing_id: str) -> bool:
@@ -449,10 +669,11 @@ def delete_listing(listing_id: str) -> bool:
     _ensure_config()
     _delete_all_category_details(listing_id)
     url = f"{SUPABASE_URL}/rest/v1/{PRODUCTS_TABLE}"
-    resp = requests.delete(
-        url, headers=_headers(), params={PRODUCT_ID_FIELD: f"eq.{listing_id}"}
+    resp = _session().delete(
+        url, params={PRODUCT_ID_FIELD: _eq(listing_id)}
     )
     resp.raise_for_status()
+    _invalidate_listing(listing_id)
     return True
 
 
@@ -471,12 +692,15 @@ def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
     # fetch a supabase user record including public metadata usable across the app
 
     _ensure_config()
+    cached = _cache_get(_PROFILE_CACHE, user_id)
+    if cached is not None:
+        return cached
     url = f"{SUPABASE_URL}/auth/v1/admin/users/{user_id}"
-    resp = requests.get(url, headers=_headers())
+    resp = _session().get(url)
     if resp.status_code == 404:
         return None
     resp.raise_for_status()
-    data = resp.json()
+    data = _loads(resp.content)
     metadata = data.get("user_metadata") or {}
     avatar_path = metadata.get("avatar_path")
     profile = {
@@ -487,28 +711,30 @@ def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
         "avatar_path": avatar_path,
         "avatar_url": _public_storage_url(avatar_path),
     }
+    _cache_set(_PROFILE_CACHE, user_id, profile)
     return profile
 
 
+def user_exists(user_id: str) -> bool:
+    if _cache_get(_USER_EXISTS_CACHE, user_id):
+        return True
+    if get_user_profile(user_id) is None:
+        return False
+    _cache_set(_USER_EXISTS_CACHE, user_id, True)
+    return True
+
+
 def get_orders(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     # return transactions for products
 
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    product_select = _select_clause_with_details()
-    product_relation = _product_relationship()
-    params: Dict[str, Any] = {"select": f"*,product:{product_relation}({product_select})"}
-    if filters:
-        for key, value in filters.items():
-            if value is None:
-                continue
-            if isinstance(value, bool):
-                params[key] = f"eq.{str(value).lower()}"
-            else:
-                params[key] = f"eq.{value}"
-    resp = requests.get(url, headers=_headers(), params=params)
+    filters_product = any(key.startswith("product.") for key in filters or ())
+    params: Dict[str, Any] = {"select": _order_select_clause(filters_product)}
+    _apply_filters(params, filters)
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    data = resp.json()
+    data = _loads(resp.content)
     if isinstance(data, dict) and data.get("message"):
         raise RuntimeError(f"Supabase error: {data}")
     return [_normalize_order(order) for order in data]
@@ -518,31 +744,89 @@ def create_order(order_data: Dict[str, Any]) -> Dict[str, Any]:
     # insert a new transaction and return the created record
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    product_select = _select_clause_with_details()
-    params = {"select": f"*,product:{_product_relationship()}({product_select})"}
-    resp = requests.post(url, headers=headers, params=params, json=order_data)
+    params = {"select": _order_select_clause()}
+    resp = _session().post(url, headers=_PREFER_REPRESENTATION, params=params, data=_dumps(order_data))
     if not resp.ok:
         print("SUPABASE STATUS:", resp.status_code)
         print("SUPABASE BODY:", resp.text)
     resp.raise_for_status()
-    created = resp.json()
+    created = _loads(resp.content)
     return _normalize_order(created[0])
 
 
+# backend/sql/004_purchase_listing.sql hard-codes the default Product/Transactions names
+_PURCHASE_RPC_AVAILABLE: bool = (PRODUCTS_TABLE, PRODUCT_ID_FIELD, TRANSACTIONS_TABLE) == (
+    "Product",
+    "prod_id",
+    "Transactions",
+)
+
+
+def _purchase_listing_fallback(listing: Dict[str, Any], order_data: Dict[str, Any]) -> Dict[str, Any]:
+    # non-atomic path used until backend/sql/004_purchase_listing.sql is deployed; the inventory
+    # is re-read uncached so the decrement isn't computed from a stale cache entry
+    listing = get_listing(listing["id"], cached=False)
+    if not listing:
+        raise ValueError("Listing not found")
+    if listing.get("sold"):
+        raise ValueError("Listing has already been sold")
+    created = create_order(order_data)
+    quantity = listing.get("quantity", 1)
+    update_fields: Dict[str, Any] = {}
+    if isinstance(quantity, int):
+        new_quantity = max(quantity - 1, 0)
+        update_fields["quantity"] = new_quantity
+        if new_quantity == 0:
+            update_fields["sold"] = True
+    else:
+        update_fields["sold"] = True
+    update_listing(listing["id"], update_fields)
+    return created
+
+
+def purchase_listing(listing: Dict[str, Any], order_data: Dict[str, Any]) -> Dict[str, Any]:
+    # record a transaction and decrement the listing's inventory in one locked round-trip,
+    # raises ValueError when the listing can no longer be bought
+    global _PURCHASE_RPC_AVAILABLE
+    _ensure_config()
+    if _PURCHASE_RPC_AVAILABLE:
+        url = f"{SUPABASE_URL}/rest/v1/rpc/purchase_listing"
+        params = {"select": _order_select_clause()}
+        body = {
+            "p_listing_id": order_data["prod_id"],
+            "p_buyer_id": order_data["buyer_id"],
+            "p_payment_method": order_data.get("payment_method"),
+            "p_created_at": order_data.get("created_at"),
+        }
+        resp = _session().post(url, params=params, data=_dumps(body))
+        if resp.status_code != 404:
+            if resp.status_code == 400:
+                error = _loads(resp.content)
+                if error.get("code") == "P0001":
+                    raise ValueError(error.get("message") or "Listing cannot be purchased")
+            if not resp.ok:
+                print("SUPABASE RPC ERROR (purchase_listing):", resp.status_code, resp.text)
+            resp.raise_for_status()
+            _invalidate_listing(order_data["prod_id"])
+            created = _loads(resp.content)
+            if isinstance(created, list):
+                created = created[0]
+            return _normalize_order(created)
+        _PURCHASE_RPC_AVAILABLE = False
+    return _purchase_listing_fallback(listing, order_data)
+
+
 def get_order(order_id: str) -> Optional[Dict[str, Any]]:
     # return a single transaction by its id or None if it is not found
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    product_select = _select_clause_with_details()
     params = {
-        TRANSACTION_ID_FIELD: f"eq.{order_id}",
-        "select": f"*,product:{_product_relationship()}({product_select})",
+        TRANSACTION_ID_FIELD: _eq(order_id),
+        "select": _order_select_clause(),
     }
-    resp = requests.get(url, headers=_headers(), params=params)
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    data = resp.json()
+    data = _loads(resp.content)
     if isinstance(data, dict):
         if data.get("message") or data.get("code"):
             raise RuntimeError(f"Supabase error: {data}")
@@ -558,21 +842,18 @@ def update_order(order_id: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
     #update a transaction and return the updated record
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{TRANSACTIONS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
-    product_select = _select_clause_with_details()
     params = {
-        TRANSACTION_ID_FIELD: f"eq.{order_id}",
-        "select": f"*,product:{_product_relationship()}({product_select})",
+        TRANSACTION_ID_FIELD: _eq(order_id),
+        "select": _order_select_clause(),
     }
-    resp = requests.patch(
+    resp = _session().patch(
         url,
-        headers=headers,
+        headers=_PREFER_REPRESENTATION,
         params=params,
-        json=order_data,
+        data=_dumps(order_data),
     )
     resp.raise_for_status()
-    updated = resp.json()
+    updated = _loads(resp.content)
     return _normalize_order(updated[0])
 
 
@@ -581,9 +862,9 @@ def get_reports(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]
     url = f"{SUPABASE_URL}/rest/v1/{REPORTS_TABLE}"
     params: Dict[str, Any] = {"select": "*", "order": "created_at.desc"}
     _apply_filters(params, filters)
-    resp = requests.get(url, headers=_headers(), params=params)
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    records = resp.json()
+    records = _loads(resp.content)
     return [_normalize_report(record) for record in records]
 
 
@@ -591,37 +872,42 @@ def get_report(report_id: str) -> Optional[Dict[str, Any]]:
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{REPORTS_TABLE}"
     params = {
-        REPORT_ID_FIELD: f"eq.{report_id}",
+        REPORT_ID_FIELD: _eq(report_id),
         "select": "*",
     }
-    resp = requests.get(url, headers=_headers(), params=params)
+    resp = _session().get(url, params=params)
     resp.raise_for_status()
-    records = resp.json()
+    records = _loads(resp.content)
     return _normalize_report(records[0]) if records else None
 
 
 def create_report(report_data: Dict[str, Any]) -> Dict[str, Any]:
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{REPORTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
     params = {"select": "*"}
-    resp = requests.post(url, headers=headers, params=params, json=report_data)
+    resp = _session().post(url, headers=_PREFER_REPRESENTATION, params=params, data=_dumps(report_data))
     resp.raise_for_status()
-    created = resp.json()
+    created = _loads(resp.content)
     return _normalize_report(created[0])
 
 
 def update_report(report_id: str, report_data: Dict[str, Any]) -> Dict[str, Any]:
     _ensure_config()
     url = f"{SUPABASE_URL}/rest/v1/{REPORTS_TABLE}"
-    headers = _headers()
-    headers["Prefer"] = "return=representation"
     params = {
-        REPORT_ID_FIELD: f"eq.{report_id}",
+        REPORT_ID_FIELD: _eq(report_id),
         "select": "*",
     }
-    resp = requests.patch(url, headers=headers, params=params, json=report_data)
+    resp = _session().patch(url, headers=_PREFER_REPRESENTATION, params=params, data=_dumps(report_data))
     resp.raise_for_status()
-    updated = resp.json()
+    updated = _loads(resp.content)
     return _normalize_report(updated[0])
+
+
+async def _in_thread(func: Callable[..., Any], *args: Any) -> Any:
+    # run a blocking helper off the event loop; concurrent calls share the pooled session
+    return await asyncio.to_thread(func, *args)
+
+
+async def aget_reports(filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return await _in_thread(get_reports, filters)
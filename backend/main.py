@@ -2,22 +2,60 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import heapq
 import os
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
-import re
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Iterable, List, Dict, Any, Optional, Tuple
+import string
+import threading
+import time
+from contextlib import asynccontextmanager
 from difflib import SequenceMatcher
 
-from fastapi import Body, Depends, FastAPI, HTTPException, status
+import anyio.to_thread
+from cachetools import TTLCache
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt
+import orjson
 from fastapi.middleware.cors import CORSMiddleware
 
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # fall back to difflib when the compiled scorer isn't installed
+    fuzz = process = None
+
 import database, schemas
 
 MAX_REPORT_EVIDENCE = 5
-
-app = FastAPI(title="UMarket API", version="0.1.0")
+EXACT_SEARCH_HITS = 10
+SEARCH_RESULT_LIMIT = 50
+SEARCH_MIN_SCORE = 0.35
+MIN_FUZZY_TERM_LENGTH = 2
+API_WORKER_THREADS = int(os.getenv("API_WORKER_THREADS", "100"))
+# ascii punctuation becomes whitespace so tokens fall out of a plain str.split()
+_TOKEN_SEPARATORS = str.maketrans(dict.fromkeys(string.punctuation, " "))
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # sync routes run on anyio's worker threads (40 by default), which caps concurrent
+    # Supabase calls well below the session's connection pool, so raise the limit to match
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_WORKER_THREADS
+    yield
+
+
+app = FastAPI(
+    title="UMarket API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=_lifespan,
+)
 
 frontend_origin_env = os.getenv("FRONTEND_URLS") or os.getenv("FRONTEND_URL", "http://localhost:3000")
 frontend_origins = [origin.strip() for origin in frontend_origin_env.split(",") if origin.strip()]
@@ -28,9 +66,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+
 _http_bearer = HTTPBearer(auto_error=False)
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_TOKEN_CACHE_LOCK = threading.Lock()
 
 
 def _now_iso() -> str:
@@ -66,25 +108,88 @@ def _clean_text(value: Optional[str]) -> Optional[str]:
 
 
 def _sanitize_evidence_urls(
-    values: Optional[List[str]], max_items: int = MAX_REPORT_EVIDENCE
+    values: Optional[Iterable[str]], max_items: int = MAX_REPORT_EVIDENCE
 ) -> List[str]:
     if not values:
         return []
-    cleaned: List[str] = []
-    for value in values:
-        if value is None:
+    # extra items past max_items are dropped, matching what the upload form allows
+    stripped = (str(value).strip() for value in values if value is not None)
+    return list(islice(filter(None, stripped), max_items))
+
+
+@lru_cache(maxsize=4096)
+def _search_fields(name: str, category: str, description: str) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    # lowercased text and tokens per searchable field, memoized across requests since listings rarely change
+    fields = []
+    for value in (name, category, description):
+        if not value:
             continue
-        text = str(value).strip()
-        if text:
-            cleaned.append(text)
-        if len(cleaned) >= max_items:
-            break
-    if len(cleaned) > max_items:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"You can attach at most {max_items} evidence items",
-        )
-    return cleaned
+        lowered = value.lower()
+        fields.append((lowered, tuple(lowered.translate(_TOKEN_SEPARATORS).split())))
+    return tuple(fields)
+
+
+def _listing_search_fields(item: Dict[str, Any]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    return _search_fields(
+        str(item.get("name") or ""),
+        str(item.get("category") or ""),
+        str(item.get("description") or ""),
+    )
+
+
+def _has_exact_match(term: str, item: Dict[str, Any]) -> bool:
+    return any(term in field_lower for field_lower, _ in _listing_search_fields(item))
+
+
+def _difflib_best_ratio(matcher: SequenceMatcher, candidates: Iterable[str]) -> float:
+    # matcher holds the search term as seq2, so its b2j index is built once per request
+    best = 0.0
+    for candidate in candidates:
+        matcher.set_seq1(candidate)
+        threshold = max(best, SEARCH_MIN_SCORE)
+        if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+            continue
+        best = max(best, matcher.ratio())
+    return best
+
+
+def _score_listing(
+    term: str, item: Dict[str, Any], matcher: Optional[SequenceMatcher] = None
+) -> float:
+    fields = _listing_search_fields(item)
+    # a substring hit in any field is already the best possible score
+    if any(term in field_lower for field_lower, _ in fields):
+        return 1.0
+    if fuzz is None:
+        candidates = (text for field_lower, tokens in fields for text in (field_lower, *tokens))
+        return _difflib_best_ratio(matcher, candidates)
+    # ratio can't exceed 2*min(len)/(len_a + len_b), so fields far longer than the term are skipped
+    # outright and rapidfuzz prunes the rest against the cutoff internally
+    term_len = len(term)
+    max_len = term_len * (2 / SEARCH_MIN_SCORE - 1)
+    cutoff = SEARCH_MIN_SCORE * 100
+    best = 0.0
+    for field_lower, tokens in fields:
+        if len(field_lower) <= max_len:
+            best = max(best, fuzz.ratio(term, field_lower, score_cutoff=cutoff))
+        best_token = process.extractOne(term, tokens, scorer=fuzz.ratio, score_cutoff=cutoff)
+        if best_token:
+            best = max(best, best_token[1])
+    return best / 100.0
+
+
+def _decode_token(token: str, secret: str) -> Dict[str, Any]:
+    # browsers resend the same bearer token on every call, so reuse the verified claims until they expire
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get(token)
+    if cached is not None:
+        expires_at = cached.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at > time.time():
+            return cached
+    payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[token] = payload
+    return payload
 
 
 def get_current_user_id(credential: HTTPAuthorizationCredentials = Depends(_http_bearer)) -> str:
@@ -98,7 +203,7 @@ def get_current_user_id(credential: HTTPAuthorizationCredentials = Depends(_http
         raise RuntimeError("SUPABASE_JWT_SECRET environment variable must be set")
 
     try:
-        payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_aud": False})
+        payload = _decode_token(token, secret)
     except jwt.PyJWTError as exc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -111,11 +216,32 @@ def get_current_user_id(credential: HTTPAuthorizationCredentials = Depends(_http
     return user_id
 
 
+def _etag_for(payload: Any) -> str:
+    digest = hashlib.blake2b(orjson.dumps(payload), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _conditional_response(request: Request, response: Response, payload: Any) -> Any:
+    # let polling clients revalidate with If-None-Match instead of re-downloading unchanged listings
+    etag = _etag_for(payload)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return payload
+
+
 @app.get("/listings", response_model=List[schemas.Listing])
 def list_listings(
+    request: Request,
+    response: Response,
     seller_id: Optional[str] = None,
     sold: Optional[bool] = None,
     search: Optional[str] = None,
+    limit: int = Query(SEARCH_RESULT_LIMIT, ge=1, description="Maximum number of search results"),
+    page_size: Optional[int] = Query(
+        None, ge=1, le=200, description="Page through unsearched listings, newest first"
+    ),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
 ) -> List[schemas.Listing]:
     # return all listings, optional filtering by seller or sold flag
 
@@ -124,58 +250,54 @@ def list_listings(
         filters["seller_id"] = seller_id
     if sold is not None:
         filters["sold"] = sold
+    if page_size is not None and not search:
+        try:
+            page = database.get_listings(filters or None, page_size=page_size, cursor=cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
+        if len(page) == page_size:
+            response.headers["X-Next-Cursor"] = database.listing_cursor(page[-1])
+        return _conditional_response(request, response, page)
     listings = database.get_listings(filters if filters else None)
     if not search:
-        return listings
+        return _conditional_response(request, response, listings)
 
     term = search.strip().lower()
     if not term:
-        return listings
-
-    def _tokenize(value: str) -> List[str]:
-        return re.findall(r"[a-z0-9]+", value.lower())
-
-    def _score_listing(item: Dict[str, Any]) -> float:
-        fields = [
-            str(item.get("name", "")),
-            str(item.get("category", "")),
-            str(item.get("description", "")),
-        ]
-        scores = []
-        for field in fields:
-            if not field:
-                continue
-            field_lower = field.lower()
-            if term in field_lower:
-                scores.append(1.0)
-                continue
-            scores.append(SequenceMatcher(None, term, field_lower).ratio())
-            tokens = _tokenize(field)
-            for token in tokens:
-                if term in token:
-                    scores.append(0.95)
-                else:
-                    scores.append(SequenceMatcher(None, term, token).ratio())
-        return max(scores) if scores else 0.0
-
+        return _conditional_response(request, response, listings)
+
+    # substring hits already score 1.0, so when there are enough of them skip fuzzy scoring entirely;
+    # single-character terms are too short for fuzzy scores to mean anything
+    exact_hits = [listing for listing in listings if _has_exact_match(term, listing)]
+    if len(exact_hits) >= EXACT_SEARCH_HITS or len(term) < MIN_FUZZY_TERM_LENGTH:
+        return _conditional_response(request, response, exact_hits[:limit])
+
+    matcher = None
+    if fuzz is None:
+        # autojunk only kicks in for 200+ char seq2; keep it off so long terms aren't silently mangled
+        matcher = SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(term)
     scored = []
     for listing in listings:
-        score = _score_listing(listing)
-        if score >= 0.35:
+        score = _score_listing(term, listing, matcher)
+        if score >= SEARCH_MIN_SCORE:
             scored.append((score, listing))
 
     if not scored:
-        return listings
+        return _conditional_response(request, response, listings)
 
-    scored.sort(key=lambda pair: pair[0], reverse=True)
-    return [item for _, item in scored]
+    top = heapq.nlargest(limit, scored, key=lambda pair: pair[0])
+    return _conditional_response(request, response, [item for _, item in top])
 
 
 @app.post("/listings", response_model=schemas.Listing, status_code=status.HTTP_201_CREATED)
-def create_listing(listing: schemas.ListingCreate, user_id: str = Depends(get_current_user_id)):
+def create_listing(
+    listing: schemas.ListingCreate = Body(..., discriminator="category"),
+    user_id: str = Depends(get_current_user_id),
+):
     #create a new listing owned by the authenticaed user
 
-    data = listing.dict(exclude_unset=True)
+    data = listing.model_dump(exclude_unset=True)
     details_payload = data.pop("details", None)
     description = data.get("description")
     if isinstance(description, str):
@@ -196,12 +318,12 @@ def create_listing(listing: schemas.ListingCreate, user_id: str = Depends(get_cu
 
 
 @app.get("/listings/{listing_id}", response_model=schemas.Listing)
-def retrieve_listing(listing_id: str) -> schemas.Listing:
+def retrieve_listing(listing_id: str, request: Request, response: Response) -> schemas.Listing:
     #fetch a listing by ID
     listing = database.get_listing(listing_id)
     if not listing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
-    return listing
+    return _conditional_response(request, response, listing)
 
 
 @app.patch("/listings/{listing_id}", response_model=schemas.Listing)
@@ -221,7 +343,7 @@ def edit_listing(
             detail="You are not authorized to edit this listing",
         )
 
-    data = listing.dict(exclude_unset=True)
+    data = listing.model_dump(exclude_unset=True)
     details_payload = data.pop("details", None)
     existing_details = existing.get("details")
     final_category = data.get("category") or existing.get("category")
@@ -232,24 +354,10 @@ def edit_listing(
         details_to_persist = existing_details
     else:
         details_to_persist = details_payload
-    update_data: Dict[str, Any] = {}
-    if data.get("name") is not None:
-        update_data["name"] = data["name"]
+    update_data: Dict[str, Any] = {key: value for key, value in data.items() if value is not None}
     if "description" in data:
-        description_value = data["description"]
-        if isinstance(description_value, str):
-            description_value = description_value.strip()
-            if description_value == "":
-                description_value = None
-        update_data["description"] = description_value
-    if data.get("price") is not None:
-        update_data["price"] = data["price"]
-    if data.get("quantity") is not None:
-        update_data["quantity"] = data["quantity"]
-    if data.get("sold") is not None:
-        update_data["sold"] = data["sold"]
-    if data.get("category") is not None:
-        update_data["category"] = data["category"]
+        # an explicit null or blank description clears it
+        update_data["description"] = _clean_text(data["description"])
     if not update_data and not details_changed:
         return existing
     if isinstance(details_to_persist, dict):
@@ -333,23 +441,11 @@ def create_order(order: schemas.OrderCreate, user_id: str = Depends(get_current_
     # make sure transactions capture when they were placed so the dashboard can show the ordered timestamp
     order_payload.setdefault("created_at", _now_iso())
 
-    created = database.create_order(order_payload)
-
-    update_fields: Dict[str, Any] = {}
-    if isinstance(quantity, int):
-        new_quantity = max(quantity - 1, 0)
-        update_fields["quantity"] = new_quantity
-        if new_quantity == 0:
-            update_fields["sold"] = True
-    else:
-        update_fields["sold"] = True
-    if update_fields:
-        database.update_listing(
-            order.listing_id,
-            update_fields,
-            details=listing.get("details"),
-        )
-
+    try:
+        created = database.purchase_listing(listing, order_payload)
+    except ValueError as exc:
+        # the listing sold out or changed hands between the checks above and the purchase
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)) from exc
     return created
 
 
@@ -370,7 +466,7 @@ def update_order(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You are not authorized to update this order",
         )
-    update_fields = payload.dict(exclude_unset=True)
+    update_fields = payload.model_dump(exclude_unset=True)
     if not update_fields:
         return order
     updated = database.update_order(order_id, update_fields)
@@ -429,9 +525,11 @@ def confirm_payment_received(
 
 
 @app.get("/reports", response_model=schemas.MyReports)
-def list_my_reports(user_id: str = Depends(get_current_user_id)):
-    filed = database.get_reports({"reporter_id": user_id})
-    against = database.get_reports({"reported_user_id": user_id})
+async def list_my_reports(user_id: str = Depends(get_current_user_id)):
+    filed, against = await asyncio.gather(
+        database.aget_reports({"reporter_id": user_id}),
+        database.aget_reports({"reported_user_id": user_id}),
+    )
     return {"filed": filed, "against": against}
 
 
@@ -445,10 +543,9 @@ def create_report(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="You cannot report yourself",
         )
-    target_profile = database.get_user_profile(report.reported_user_id)
-    if not target_profile:
+    if not database.user_exists(report.reported_user_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reported user not found")
-    report_data = report.dict()
+    report_data = report.model_dump()
     report_data["reporter_id"] = user_id
     report_data["description"] = report.description.strip()
     report_data["evidence_urls"] = _sanitize_evidence_urls(report.evidence_urls)
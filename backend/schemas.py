@@ -1,10 +1,13 @@
 from datetime import datetime
-from typing import Optional, Literal, Union, Annotated, List
+from typing import Any, Callable, Dict, Optional, Literal, Union, Annotated, FrozenSet, List, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, HttpUrl, TypeAdapter, model_validator
 
 CategorySlug = Literal["decor", "clothing", "school-supplies", "tickets", "miscellaneous"]
+_CATEGORIES_REQUIRING_DETAILS: FrozenSet[str] = frozenset({"clothing", "decor", "tickets"})
 
+# option sets stay plain Literals: pydantic-core checks string literals with a single hash lookup,
+# and the values round-trip to Supabase and JSON as ordinary strings
 ColorValue = Literal[
     "RED",
     "ORANGE",
@@ -64,12 +67,37 @@ OrderStatus = Literal["pending_meetup", "buyer_confirmed", "seller_confirmed", "
 ReportCategory = Literal["NO_SHOW", "PAYMENT_ISSUE", "ITEM_NOT_AS_DESCRIBED", "SCAM", "OTHER"]
 ReportStatus = Literal["OPEN", "UNDER_REVIEW", "RESOLVED", "DISMISSED"]
 
+def _field_docs(**docs: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    # json_schema_extra hook for plain-default fields: adds openapi docs without a Field() per field
+    def extra(schema: Dict[str, Any]) -> None:
+        properties = schema.get("properties", {})
+        for name, doc in docs.items():
+            properties[name].update(doc)
 
-class CategoryDetailsBase(BaseModel):
-    category: CategorySlug
+    return extra
 
 
-class ClothingDetails(CategoryDetailsBase):
+# response models are built straight from Supabase rows and never mutated; one config object serves all of them
+_ORM_CONFIG = ConfigDict(from_attributes=True, frozen=True)
+
+# shared text constraints so each limit is declared once
+Note500 = Annotated[str, Field(max_length=500)]
+Note2000 = Annotated[str, Field(max_length=2000)]
+ReportText = Annotated[str, Field(min_length=10, max_length=2000)]
+
+
+def _drop_blank_urls(values: Any) -> Any:
+    # blank entries from the upload form are ignored rather than rejected as invalid urls
+    if isinstance(values, (list, tuple)):
+        return tuple(value for value in values if not isinstance(value, str) or value.strip())
+    return values
+
+
+# incoming evidence must be real http(s) links; stored reports keep plain strings
+EvidenceUrls = Annotated[Tuple[HttpUrl, ...], BeforeValidator(_drop_blank_urls)]
+
+
+class ClothingDetails(BaseModel):
     category: Literal["clothing"] = Field("clothing")
     gender: ClothingGender
     size: ClothingSize
@@ -78,7 +106,7 @@ class ClothingDetails(CategoryDetailsBase):
     used: bool = Field(False, description="Whether the item is used")
 
 
-class DecorDetails(CategoryDetailsBase):
+class DecorDetails(BaseModel):
     category: Literal["decor"] = Field("decor")
     type: DecorType
     color: ColorValue
@@ -88,139 +116,176 @@ class DecorDetails(CategoryDetailsBase):
     height: Optional[int] = Field(None, ge=0, description="Height in inches")
 
 
-class TicketDetails(CategoryDetailsBase):
+class TicketDetails(BaseModel):
     category: Literal["tickets"] = Field("tickets")
     type: TicketType
 
 
-class SchoolSuppliesDetails(CategoryDetailsBase):
+class SchoolSuppliesDetails(BaseModel):
     category: Literal["school-supplies"] = Field("school-supplies")
     type: Optional[str] = Field(None, description="Optional school supplies subtype")
     used: bool = Field(False, description="Whether the item is used")
 
 
-class MiscellaneousDetails(CategoryDetailsBase):
+class MiscellaneousDetails(BaseModel):
     category: Literal["miscellaneous"] = Field("miscellaneous")
     type: Optional[str] = Field(None, description="Optional miscellaneous subtype")
 
 
-CategoryDetails = Annotated[
-    Union[ClothingDetails, DecorDetails, TicketDetails, SchoolSuppliesDetails, MiscellaneousDetails],
-    Field(discriminator="category"),
+CategoryDetailsModel = Union[
+    ClothingDetails, DecorDetails, TicketDetails, SchoolSuppliesDetails, MiscellaneousDetails
 ]
+CategoryDetails = Annotated[CategoryDetailsModel, Field(discriminator="category")]
+
+# built once at import; validating loose details dicts through it skips rebuilding the union schema
+CATEGORY_DETAILS_ADAPTER: TypeAdapter = TypeAdapter(CategoryDetails)
+
+
+def validate_category_details(raw: Dict[str, Any]) -> CategoryDetailsModel:
+    return CATEGORY_DETAILS_ADAPTER.validate_python(raw)
 
 
 class ListingBase(BaseModel):
     # base attributes for product creation/update
 
-    name: str = Field(..., example="Microwave")
+    name: str = Field(..., json_schema_extra={"example": "Microwave"})
     description: Optional[str] = Field(
         None,
         description="Long-form description shown on the listing detail page",
-        example="Gently used microwave in excellent condition.",
+        json_schema_extra={"example": "Gently used microwave in excellent condition."},
         max_length=1500,
     )
-    price: float = Field(..., example=25.0, gt=0, description="Price in dollars")
+    price: float = Field(..., json_schema_extra={"example": 25.0}, gt=0, description="Price in dollars")
     quantity: int = Field(1, ge=0, description="Quantity available")
     category: CategorySlug = Field(
         ...,
         description="Category slug used for homepage grouping",
-        example="decor",
-    )
-    details: Optional[CategoryDetails] = Field(
-        None,
-        description="Category-specific attributes (required for clothing, decor, and tickets)",
+        json_schema_extra={"example": "decor"},
     )
+    details: Annotated[
+        Optional[CategoryDetails],
+        Field(description="Category-specific attributes (required for clothing, decor, and tickets)"),
+    ] = None
 
 
-class ListingCreate(ListingBase):
-    # payload is required to create a new product listing
+# create payloads are one model per category so the category tag picks the matching details type;
+# clothing, decor and tickets listings must carry details, the rest may omit them
 
-    @classmethod
-    def _requires_details(cls, category: Optional[str]) -> bool:
-        return category in {"clothing", "decor", "tickets"}
 
-    @classmethod
-    def _validate_details(cls, category: Optional[str], details: Optional[CategoryDetails]) -> None:
-        if not category:
-            return
-        if cls._requires_details(category) and details is None:
-            raise ValueError(f"Details are required when creating a {category} listing")
-        if details is not None and details.category != category:
-            raise ValueError("Details category must match the listing category")
+class ClothingListingCreate(ListingBase):
+    category: Literal["clothing"]
+    details: ClothingDetails
+
+
+class DecorListingCreate(ListingBase):
+    category: Literal["decor"]
+    details: DecorDetails
+
+
+class TicketListingCreate(ListingBase):
+    category: Literal["tickets"]
+    details: TicketDetails
+
+
+class SchoolSuppliesListingCreate(ListingBase):
+    category: Literal["school-supplies"]
+    details: Optional[SchoolSuppliesDetails] = None
+
+
+class MiscellaneousListingCreate(ListingBase):
+    category: Literal["miscellaneous"]
+    details: Optional[MiscellaneousDetails] = None
+
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        self._validate_details(self.category, self.details)
+# validated with discriminator="category" (see create_listing); fastapi only accepts a union body
+# through Body(), so the tag is given there rather than in an Annotated alias
+ListingCreate = Union[
+    ClothingListingCreate,
+    DecorListingCreate,
+    TicketListingCreate,
+    SchoolSuppliesListingCreate,
+    MiscellaneousListingCreate,
+]
 
 
 class ListingUpdate(BaseModel):
     # partial update payload for product listings
 
-    name: Optional[str] = Field(None, example="Microwave")
+    model_config = ConfigDict(
+        json_schema_extra=_field_docs(
+            name={"example": "Microwave"},
+            sold={"description": "Whether the item is sold"},
+        )
+    )
+
+    name: Optional[str] = None
     description: Optional[str] = Field(
         None,
         description="Long-form description shown on the listing detail page",
-        example="Gently used microwave in excellent condition.",
+        json_schema_extra={"example": "Gently used microwave in excellent condition."},
         max_length=1500,
     )
     price: Optional[float] = Field(None, gt=0, description="Price in dollars")
     quantity: Optional[int] = Field(None, ge=0, description="Quantity available")
-    sold: Optional[bool] = Field(None, description="Whether the item is sold")
+    sold: Optional[bool] = None
     category: Optional[CategorySlug] = Field(
         None,
         description="Category slug used for homepage grouping",
-        example="decor",
+        json_schema_extra={"example": "decor"},
     )
-    details: Optional[CategoryDetails] = Field(
-        None,
-        description="Category-specific attributes to replace the existing ones",
-    )
-
-    @classmethod
-    def _requires_details(cls, category: Optional[str]) -> bool:
-        return category in {"clothing", "decor", "tickets"}
-
-    def __init__(self, **data):
-        super().__init__(**data)
-        category = getattr(self, "category", None)
-        details = getattr(self, "details", None)
-        if category and self._requires_details(category) and details is None:
-            raise ValueError(f"Details are required when changing a listing to {category}")
-        if details is not None and category and details.category != category:
+    details: Annotated[
+        Optional[CategoryDetails],
+        Field(description="Category-specific attributes to replace the existing ones"),
+    ] = None
+
+    @model_validator(mode="after")
+    def check_details(self) -> "ListingUpdate":
+        category = self.category
+        # updates that leave the category alone have nothing to cross-check
+        if category is None:
+            return self
+        details = self.details
+        # branch on details first: the mismatch check below still needs details when the category
+        # doesn't require them, so testing membership first wouldn't save the None check
+        if details is None:
+            if category in _CATEGORIES_REQUIRING_DETAILS:
+                raise ValueError(f"Details are required when changing a listing to {category}")
+        elif details.category != category:
             raise ValueError("Details category must match the listing category")
+        return self
 
 
 class Listing(ListingBase):
     # full representation of a product listing including server-managed fields
 
+    model_config = _ORM_CONFIG
+
     id: str
     seller_id: str
     sold: bool = Field(False, description="Whether the item has been sold")
     created_at: datetime
 
-    class Config:
-        orm_mode = True
-
 
 class OrderCreate(BaseModel):
     # payload required to create a new transaction
 
-    listing_id: str = Field(..., example="6c73f63a-4f0f-4a84-9620-3aafc4a5d1b5")
+    listing_id: str = Field(..., json_schema_extra={"example": "6c73f63a-4f0f-4a84-9620-3aafc4a5d1b5"})
     payment_method: Optional[TransactionPaymentMethod] = Field(
-        None, example="CASH", description="Preferred payment method"
+        None, json_schema_extra={"example": "CASH"}, description="Preferred payment method"
     )
 
 
 class Order(BaseModel):
     # full representation for a transaction
 
+    model_config = _ORM_CONFIG
+
     id: str
     listing_id: str
     buyer_id: str
     seller_id: Optional[str] = Field(None, description="Seller for the associated product")
     payment_method: Optional[TransactionPaymentMethod] = Field(
-        None, example="CASH", description="Preferred payment method"
+        None, json_schema_extra={"example": "CASH"}, description="Preferred payment method"
     )
     created_at: Optional[datetime] = None
     product: Optional[Listing] = None
@@ -228,25 +293,24 @@ class Order(BaseModel):
     seller_confirmed: bool = Field(False, description="Seller confirmed receiving payment")
     buyer_confirmed_at: Optional[datetime] = None
     seller_confirmed_at: Optional[datetime] = None
-    buyer_confirmation_notes: Optional[str] = Field(None, max_length=500)
-    seller_confirmation_notes: Optional[str] = Field(None, max_length=500)
+    buyer_confirmation_notes: Optional[Note500] = None
+    seller_confirmation_notes: Optional[Note500] = None
     status: OrderStatus = Field("pending_meetup", description="Derived transaction status")
 
-    class Config:
-        orm_mode = True
-
 
 class OrderUpdate(BaseModel):
-    payment_method: Optional[TransactionPaymentMethod] = Field(
-        None, example="CASH", description="Preferred payment method"
+    model_config = ConfigDict(
+        json_schema_extra=_field_docs(
+            payment_method={"description": "Preferred payment method", "example": "CASH"},
+        )
     )
 
+    payment_method: Optional[TransactionPaymentMethod] = None
+
 
 class OrderConfirmation(BaseModel):
-    notes: Optional[str] = Field(
-        None,
-        max_length=500,
-        description="Optional short note recorded with the confirmation",
+    notes: Optional[Note500] = Field(
+        None, description="Optional short note recorded with the confirmation"
     )
 
 
@@ -256,23 +320,17 @@ class ReportBase(BaseModel):
         None, description="Optional transaction involved in the report"
     )
     category: ReportCategory = Field(..., description="Type of issue encountered")
-    description: str = Field(
-        ...,
-        min_length=10,
-        max_length=2000,
-        description="Description of what happened",
-    )
-    evidence_urls: List[str] = Field(
-        default_factory=list,
-        description="Optional supporting evidence URLs",
-    )
+    description: ReportText = Field(..., description="Description of what happened")
+    evidence_urls: Tuple[str, ...] = Field((), description="Optional supporting evidence URLs")
 
 
 class ReportCreate(ReportBase):
-    pass
+    evidence_urls: EvidenceUrls = Field((), description="Optional supporting evidence URLs")
 
 
 class Report(ReportBase):
+    model_config = _ORM_CONFIG
+
     id: str
     reporter_id: str
     status: ReportStatus = Field("OPEN", description="Workflow status of the report")
@@ -283,18 +341,15 @@ class Report(ReportBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
-
 
 class ReportUpdate(BaseModel):
     status: Optional[ReportStatus] = None
-    resolution_notes: Optional[str] = Field(
-        None, max_length=2000, description="Moderator notes about this report"
+    resolution_notes: Optional[Note2000] = Field(
+        None, description="Moderator notes about this report"
     )
-    evidence_urls: Optional[List[str]] = None
-    description: Optional[str] = Field(
-        None, min_length=10, max_length=2000, description="Updated description from reporter"
+    evidence_urls: Optional[EvidenceUrls] = None
+    description: Optional[ReportText] = Field(
+        None, description="Updated description from reporter"
     )
 
 
@@ -304,12 +359,11 @@ class MyReports(BaseModel):
 
 
 class UserProfile(BaseModel):
+    model_config = _ORM_CONFIG
+
     id: str
     email: Optional[str] = None
     full_name: Optional[str] = None
     profile_description: Optional[str] = None
     avatar_path: Optional[str] = None
     avatar_url: Optional[str] = None
-
-    class Config:
-        orm_mode = True
@@ -0,0 +1,52 @@
+-- Keeps the Clothing/Decor/Tickets detail tables in sync with a Product row in one call.
+-- The backend invokes this through POST /rest/v1/rpc/sync_listing_category after every
+-- listing write and falls back to per-table requests when the function is missing.
+--
+-- p_cat is the listing category slug; p_payload is the detail row for that category's
+-- table (or null). Every other detail table has its row for p_id removed.
+
+create or replace function public.sync_listing_category(p_id uuid, p_cat text, p_payload jsonb)
+returns void
+language plpgsql
+as $$
+begin
+  if p_cat = 'clothing' and p_payload is not null then
+    insert into public."Clothing" (clothing_id, gender, size, type, color, used)
+    select p_id, r.gender, r.size, r.type, r.color, coalesce(r.used, false)
+    from jsonb_populate_record(null::public."Clothing", p_payload) as r
+    on conflict (clothing_id) do update
+      set gender = excluded.gender,
+          size = excluded.size,
+          type = excluded.type,
+          color = excluded.color,
+          used = excluded.used;
+  else
+    delete from public."Clothing" where clothing_id = p_id;
+  end if;
+
+  if p_cat = 'decor' and p_payload is not null then
+    insert into public."Decor" (decor_id, type, color, used, length, width, height)
+    select p_id, r.type, r.color, coalesce(r.used, false), r.length, r.width, r.height
+    from jsonb_populate_record(null::public."Decor", p_payload) as r
+    on conflict (decor_id) do update
+      set type = excluded.type,
+          color = excluded.color,
+          used = excluded.used,
+          length = excluded.length,
+          width = excluded.width,
+          height = excluded.height;
+  else
+    delete from public."Decor" where decor_id = p_id;
+  end if;
+
+  if p_cat = 'tickets' and p_payload is not null then
+    insert into public."Tickets" (tickets_id, type)
+    select p_id, r.type
+    from jsonb_populate_record(null::public."Tickets", p_payload) as r
+    on conflict (tickets_id) do update
+      set type = excluded.type;
+  else
+    delete from public."Tickets" where tickets_id = p_id;
+  end if;
+end;
+$$;
@@ -0,0 +1,51 @@
+-- Records a purchase atomically: locks the Product row, checks it can still be bought,
+-- inserts the Transactions row and decrements inventory in a single call.
+-- The backend invokes this through POST /rest/v1/rpc/purchase_listing and falls back to
+-- separate insert/update requests when the function is missing.
+--
+-- Business-rule failures raise SQLSTATE P0001 so PostgREST answers 400 with the message,
+-- which the API returns to the buyer as-is.
+
+create or replace function public.purchase_listing(
+  p_listing_id uuid,
+  p_buyer_id uuid,
+  p_payment_method text default null,
+  p_created_at timestamptz default null
+)
+returns public."Transactions"
+language plpgsql
+as $$
+declare
+  v_product public."Product";
+  v_order public."Transactions";
+begin
+  select * into v_product
+  from public."Product"
+  where prod_id = p_listing_id
+  for update;
+
+  if not found then
+    raise exception 'Listing not found' using errcode = 'P0001';
+  end if;
+  if v_product.seller_id = p_buyer_id then
+    raise exception 'You cannot purchase your own listing' using errcode = 'P0001';
+  end if;
+  if v_product.sold then
+    raise exception 'Listing has already been sold' using errcode = 'P0001';
+  end if;
+  if v_product.quantity <= 0 then
+    raise exception 'Listing is out of stock' using errcode = 'P0001';
+  end if;
+
+  insert into public."Transactions" (prod_id, buyer_id, payment_method, created_at)
+  values (p_listing_id, p_buyer_id, p_payment_method, coalesce(p_created_at, now()))
+  returning * into v_order;
+
+  update public."Product"
+  set quantity = greatest(quantity - 1, 0),
+      sold = quantity <= 1
+  where prod_id = p_listing_id;
+
+  return v_order;
+end;
+$$;